@@ -2,29 +2,189 @@
 数据库操作模块 - SQLite版本
 """
 import sqlite3
-from typing import List, Optional
-from contextlib import contextmanager
+from typing import Iterator, List, Optional
+import atexit
 import os
+import queue
+import threading
+import weakref
 
 # 数据库路径
 DB_DIR = os.path.join(os.path.dirname(__file__), 'data')
-DB_PATH = os.path.join(DB_DIR, 'students.db')
+# 可以用环境变量 STUDENTS_DB_PATH 覆盖，支持 SQLite URI，
+# 例如测试时使用进程内共享的内存数据库：file:/students?vfs=memdb
+# （memdb 走正常的文件锁，busy_timeout 生效；不要用 file::memory:?cache=shared，
+# 共享缓存在并发请求下会直接返回 SQLITE_LOCKED，只适合单线程测试）
+DB_PATH = os.getenv('STUDENTS_DB_PATH', os.path.join(DB_DIR, 'students.db'))
 os.makedirs(DB_DIR, exist_ok=True)
 
+# 每个连接都需要设置的 PRAGMA（journal_mode=WAL 会持久化到文件，只需在初始化时设置一次）
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA mmap_size=268435456",
+)
 
-@contextmanager
-def get_connection():
-    conn = None
+# 数据库页大小，修改后由 init_database 通过 VACUUM 重建文件
+PAGE_SIZE = 8192
+
+# 数据库结构版本（记录在 PRAGMA user_version 中），修改表、索引等结构时需要加一
+SCHEMA_VERSION = 5
+
+# 流式读取列表时每批取出的行数
+FETCH_BATCH_SIZE = 500
+# 流式读取专用连接池中最多保留的空闲连接数
+STREAM_POOL_SIZE = 4
+
+# 查询时显式列出字段，结果行为元组，再与列名 zip 成 dict，省去 sqlite3.Row 的开销
+STUDENT_COLUMNS = ('id', 'student_id', 'name', 'gender', 'age', 'major', 'score', 'created_at', 'updated_at')
+NOTE_COLUMNS = ('id', 'title', 'content', 'color', 'is_pinned', 'created_at', 'updated_at')
+STUDENT_FIELDS = ", ".join(STUDENT_COLUMNS)
+NOTE_FIELDS = ", ".join(NOTE_COLUMNS)
+
+# SQLite 3.35 起支持 RETURNING，写入语句可以直接带回整行，省去一次 get_by_id 查询
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+NOTE_RETURNING = " RETURNING " + NOTE_FIELDS if HAS_RETURNING else ""
+# RETURNING 带回的是未经列亲和性转换的值（95.0 会变成 95），score 需要显式 CAST
+STUDENT_RETURNING = (
+    " RETURNING " + ", ".join("CAST(score AS REAL)" if col == 'score' else col for col in STUDENT_COLUMNS)
+    if HAS_RETURNING else ""
+)
+
+# 便签全文检索使用 FTS5 trigram 分词（SQLite 3.34+）：unicode61 不会切分中文，
+# trigram 支持任意子串匹配（与前端按子串过滤的语义一致），但关键字至少需要 3 个字符
+HAS_FTS_TRIGRAM = sqlite3.sqlite_version_info >= (3, 34, 0)
+FTS_MIN_KEYWORD_LENGTH = 3
+
+# SQL 语句统一定义为模块常量：sqlite3 按 SQL 文本缓存编译好的语句，连接复用后不会重复编译
+SQL_GET_ALL_STUDENTS = f"SELECT {STUDENT_FIELDS} FROM students ORDER BY id DESC"
+SQL_GET_STUDENT = f"SELECT {STUDENT_FIELDS} FROM students WHERE id = ?"
+SQL_INSERT_STUDENT = "INSERT INTO students (student_id, name, gender, age, major, score) VALUES (?, ?, ?, ?, ?, ?)"
+SQL_CREATE_STUDENT = SQL_INSERT_STUDENT + STUDENT_RETURNING
+# 部分更新：传入 None 的字段通过 COALESCE 保留原值；
+# WHERE 中只匹配确实有字段发生变化的行，值未变时不写入，updated_at 也不会被刷新
+SQL_UPDATE_STUDENT = (
+    "UPDATE students SET student_id=COALESCE(?1, student_id), name=COALESCE(?2, name), gender=COALESCE(?3, gender), "
+    "age=COALESCE(?4, age), major=COALESCE(?5, major), score=COALESCE(?6, score), updated_at=CURRENT_TIMESTAMP "
+    "WHERE id=?7 AND (COALESCE(?1, student_id) IS NOT student_id OR COALESCE(?2, name) IS NOT name "
+    "OR COALESCE(?3, gender) IS NOT gender OR COALESCE(?4, age) IS NOT age "
+    "OR COALESCE(?5, major) IS NOT major OR COALESCE(?6, score) IS NOT score)"
+    + STUDENT_RETURNING
+)
+SQL_DELETE_STUDENT = "DELETE FROM students WHERE id = ?"
+
+SQL_GET_ALL_NOTES = f"SELECT {NOTE_FIELDS} FROM notes ORDER BY is_pinned DESC, id DESC"
+SQL_GET_NOTE = f"SELECT {NOTE_FIELDS} FROM notes WHERE id = ?"
+SQL_CREATE_NOTE = "INSERT INTO notes (title, content, color, is_pinned) VALUES (?, ?, ?, ?)" + NOTE_RETURNING
+SQL_UPDATE_NOTE = (
+    "UPDATE notes SET title=COALESCE(?1, title), content=COALESCE(?2, content), color=COALESCE(?3, color), "
+    "is_pinned=COALESCE(?4, is_pinned), updated_at=CURRENT_TIMESTAMP "
+    "WHERE id=?5 AND (COALESCE(?1, title) IS NOT title OR COALESCE(?2, content) IS NOT content "
+    "OR COALESCE(?3, color) IS NOT color OR COALESCE(?4, is_pinned) IS NOT is_pinned)"
+    + NOTE_RETURNING
+)
+SQL_DELETE_NOTE = "DELETE FROM notes WHERE id = ?"
+SQL_SEARCH_NOTES = (
+    f"SELECT {NOTE_FIELDS} FROM notes WHERE id IN (SELECT rowid FROM notes_fts WHERE notes_fts MATCH ?) "
+    "ORDER BY is_pinned DESC, id DESC"
+)
+SQL_SEARCH_NOTES_LIKE = (
+    f"SELECT {NOTE_FIELDS} FROM notes WHERE title LIKE ? ESCAPE '\\' OR content LIKE ? ESCAPE '\\' "
+    "ORDER BY is_pinned DESC, id DESC"
+)
+SQL_TOGGLE_NOTE_PIN = (
+    "UPDATE notes SET is_pinned = CASE WHEN is_pinned THEN 0 ELSE 1 END, updated_at=CURRENT_TIMESTAMP WHERE id=?"
+    + NOTE_RETURNING
+)
+
+SQL_GET_TABLE_VERSION = "SELECT token || '-' || version FROM table_versions WHERE name = ?"
+SQL_HAS_NOTES_FTS = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'"
+
+
+_local = threading.local()
+# 流式响应的每一批可能在不同线程中取出，不能使用线程复用的连接；
+# 这些读取从池中借用独立连接，用完归还，避免每次请求都重新连接并设置 PRAGMA
+_stream_pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=STREAM_POOL_SIZE)
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, uri=True)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class _ThreadConnection:
+    """线程复用的连接的持有者，只由 _local 引用。
+    线程结束时 threading.local 中的数据随之释放，finalize 会关闭连接，
+    线程池中空闲退出的工作线程不会留下打开的连接和文件描述符。
+    """
+
+    def __init__(self):
+        self.conn = _connect()
+        weakref.finalize(self, self.conn.close)
+
+
+def get_connection() -> sqlite3.Connection:
+    """返回当前线程复用的连接。
+    只读查询直接在连接上 execute；写操作用 with 包裹，成功时提交、异常时回滚（不会关闭连接）。
+    """
+    holder = getattr(_local, 'holder', None)
+    if holder is None:
+        holder = _local.holder = _ThreadConnection()
+    return holder.conn
+
+
+def _acquire_stream_connection() -> sqlite3.Connection:
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        yield conn
-    except Exception as e:
-        print(f"数据库错误: {e}")
-        raise
-    finally:
-        if conn:
-            conn.close()
+        return _stream_pool.get_nowait()
+    except queue.Empty:
+        return _connect()
+
+
+def _release_stream_connection(conn: sqlite3.Connection):
+    try:
+        _stream_pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+
+@atexit.register
+def close_connections():
+    # 线程复用的连接由 weakref.finalize 在退出时关闭，这里只需关闭池中空闲的流式连接
+    while True:
+        try:
+            _stream_pool.get_nowait().close()
+        except queue.Empty:
+            break
+
+
+def _ensure_storage_settings(conn: sqlite3.Connection):
+    """确保数据库使用 PAGE_SIZE 大小的页和 WAL 模式；已满足时不做任何修改"""
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    if journal_mode == 'memory':
+        return
+    # 页大小只能在非 WAL 模式下通过 VACUUM 修改
+    if conn.execute("PRAGMA page_size").fetchone()[0] != PAGE_SIZE:
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.execute(f"PRAGMA page_size={PAGE_SIZE}")
+        conn.execute("VACUUM")
+        journal_mode = 'delete'
+    if journal_mode != 'wal':
+        journal_mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        if journal_mode != 'wal':
+            raise sqlite3.OperationalError(f"无法切换到 WAL 模式，当前为 {journal_mode}")
+
+
+def _has_notes_fts(conn: sqlite3.Connection) -> bool:
+    return conn.execute(SQL_HAS_NOTES_FTS).fetchone() is not None
+
+
+# 搜索是否走全文索引由数据库结构决定，而不是只看当前的 SQLite 版本：
+# 在旧版 SQLite 上初始化的数据库没有 notes_fts。首次搜索时检查一次并缓存
+_notes_fts_ready: Optional[bool] = None
 
 
 def init_database():
@@ -54,133 +214,275 @@ def init_database():
     )
     """
 
+    # 便签列表按 置顶、id 倒序 排列，用索引避免每次查询都做临时排序
+    create_notes_index_sql = """
+    CREATE INDEX IF NOT EXISTS idx_notes_pinned_id ON notes (is_pinned DESC, id DESC)
+    """
+
+    # notes 的外部内容全文索引，由触发器与 notes 表保持同步
+    create_notes_fts_sql = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+        title, content, content='notes', content_rowid='id', tokenize='trigram'
+    )
+    """
+
+    create_notes_fts_triggers_sql = (
+        """
+        CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE OF title, content ON notes BEGIN
+            INSERT INTO notes_fts (notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+            INSERT INTO notes_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+        END
+        """,
+    )
+
+    # 每张表的数据版本号，任何写入都会通过触发器加一，用于接口层的响应缓存和 ETag；
+    # 放在数据库里而不是进程内存中，多个 worker 进程看到的版本号才一致。
+    # 计数器在数据库重建后会从头开始，因此每行再带一个建表时生成的随机 token，
+    # 新数据库的版本号不会与旧数据库的重复
+    create_table_versions_sql = """
+    CREATE TABLE table_versions (
+        name TEXT PRIMARY KEY,
+        token TEXT NOT NULL DEFAULT (lower(hex(randomblob(8)))),
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """
+
+    create_table_versions_triggers_sql = tuple(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {event} ON {table} BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+        END
+        """
+        for table in ('students', 'notes')
+        for event in ('INSERT', 'UPDATE', 'DELETE')
+    )
+
     try:
-        with get_connection() as conn:
+        conn = get_connection()
+        # 存储设置在每次启动时都检查（只有两次 PRAGMA 查询），不受下面结构版本的提前返回影响；
+        # 转换失败（例如其他进程长时间持有读事务导致 database is locked）时下次启动会重试
+        try:
+            _ensure_storage_settings(conn)
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ 页大小/WAL 设置未完成，下次启动时重试: {e}")
+
+        # 结构已是最新版本时跳过建表、示例数据和 ANALYZE（uvicorn --reload 每次重启都会走到这里）；
+        # 在不支持 trigram 的旧版 SQLite 上初始化、之后换到新版 SQLite 运行时，仍需补建全文索引
+        def is_up_to_date():
+            return (conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION
+                    and (not HAS_FTS_TRIGRAM or _has_notes_fts(conn)))
+
+        if is_up_to_date():
+            print("✅ 数据库已是最新版本")
+            return
+
+        # 建表与示例数据放在同一个事务中，只提交一次。
+        # 多个 worker 进程会同时启动：BEGIN IMMEDIATE 先取得写锁再重新读取版本号，保证只有一个进程执行初始化
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if is_up_to_date():
+                print("✅ 数据库已是最新版本")
+                return
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
             cursor = conn.cursor()
             cursor.execute(create_students_sql)
             cursor.execute(create_notes_sql)
-            conn.commit()
+            cursor.execute(create_notes_index_sql)
+            if HAS_FTS_TRIGRAM:
+                cursor.execute(create_notes_fts_sql)
+                for sql in create_notes_fts_triggers_sql:
+                    cursor.execute(sql)
+                # 为已有的便签（包括从旧版本升级的数据库）重建索引
+                cursor.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+            # 版本表只保存计数器，结构升级时直接重建（同时换上新的 token）
+            cursor.execute("DROP TABLE IF EXISTS table_versions")
+            cursor.execute(create_table_versions_sql)
+            cursor.execute("INSERT INTO table_versions (name) VALUES ('students'), ('notes')")
+            for sql in create_table_versions_triggers_sql:
+                cursor.execute(sql)
 
-            # 插入示例数据
-            cursor.execute("SELECT COUNT(*) FROM students")
-            if cursor.fetchone()[0] == 0:
+            # 插入示例数据：只在首次初始化（user_version 为 0）时检查，结构升级时不会重复插入；
+            # 判断表是否为空用 LIMIT 1，不必像 COUNT(*) 那样扫描整张表
+            if version == 0 and cursor.execute("SELECT 1 FROM students LIMIT 1").fetchone() is None:
                 students = [
                     ('2024001', '张三', '男', 20, '计算机科学', 95),
                     ('2024002', '李四', '女', 19, '软件工程', 88),
                     ('2024003', '王五', '男', 21, '人工智能', 92),
                 ]
-                cursor.executemany(
-                    "INSERT INTO students (student_id, name, gender, age, major, score) VALUES (?, ?, ?, ?, ?, ?)",
-                    students
-                )
-                conn.commit()
+                cursor.executemany(SQL_INSERT_STUDENT, students)
 
-            print("✅ 数据库初始化成功！")
+            # 更新统计信息，让查询优化器选用上面的索引
+            cursor.execute("ANALYZE")
+            cursor.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+        print("✅ 数据库初始化成功！")
     except Exception as e:
         print(f"❌ 初始化失败: {e}")
 
 
+def _get_table_version(table: str) -> str:
+    row = get_connection().execute(SQL_GET_TABLE_VERSION, (table,)).fetchone()
+    return row[0] if row else ""
+
+
+def _iter_batches(sql: str, columns: tuple, batch_size: int) -> Iterator[List[dict]]:
+    """用 fetchmany 分批读取查询结果，使用从流式连接池借用的连接"""
+    conn = _acquire_stream_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [dict(zip(columns, row)) for row in rows]
+    finally:
+        # 响应中途中断时语句可能还未执行完，先关闭游标再归还连接
+        cursor.close()
+        _release_stream_connection(conn)
+
+
 class StudentDB:
     @staticmethod
-    def get_all() -> List[dict]:
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM students ORDER BY id DESC")
-            return [dict(row) for row in cursor.fetchall()]
+    def iter_all(batch_size: int = FETCH_BATCH_SIZE) -> Iterator[List[dict]]:
+        yield from _iter_batches(SQL_GET_ALL_STUDENTS, STUDENT_COLUMNS, batch_size)
+
+    @staticmethod
+    def version() -> str:
+        """students 表的数据版本（数据库 token + 写入计数），每次写入后都会变化"""
+        return _get_table_version('students')
 
     @staticmethod
     def get_by_id(student_id: int) -> Optional[dict]:
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM students WHERE id = ?", (student_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
+        row = get_connection().execute(SQL_GET_STUDENT, (student_id,)).fetchone()
+        return dict(zip(STUDENT_COLUMNS, row)) if row else None
 
     @staticmethod
     def create(data: dict) -> dict:
         with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO students (student_id, name, gender, age, major, score) VALUES (?, ?, ?, ?, ?, ?)",
+            cursor = conn.execute(
+                SQL_CREATE_STUDENT,
                 (data['student_id'], data['name'], data['gender'], data['age'], data['major'], data['score'])
             )
-            conn.commit()
+            if HAS_RETURNING:
+                return dict(zip(STUDENT_COLUMNS, cursor.fetchone()))
             return StudentDB.get_by_id(cursor.lastrowid)
 
     @staticmethod
-    def update(student_id: int, data: dict) -> Optional[dict]:
+    def create_many(rows: List[dict]) -> int:
+        """批量插入学生：所有行在同一个事务中用 executemany 写入，返回插入的行数"""
+        if not rows:
+            return 0
         with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE students SET student_id=?, name=?, gender=?, age=?, major=?, score=?, updated_at=CURRENT_TIMESTAMP WHERE id=?",
-                (data['student_id'], data['name'], data['gender'], data['age'], data['major'], data['score'], student_id)
+            conn.execute("BEGIN")
+            conn.executemany(
+                SQL_INSERT_STUDENT,
+                [(r['student_id'], r['name'], r['gender'], r['age'], r['major'], r['score']) for r in rows]
             )
-            conn.commit()
+        return len(rows)
+
+    @staticmethod
+    def update(student_id: int, data: dict) -> Optional[dict]:
+        # 只更新 data 中给出且不为 None 的字段；没有可更新的字段时不执行 UPDATE
+        if all(value is None for value in data.values()):
             return StudentDB.get_by_id(student_id)
+        with get_connection() as conn:
+            cursor = conn.execute(
+                SQL_UPDATE_STUDENT,
+                (data.get('student_id'), data.get('name'), data.get('gender'), data.get('age'), data.get('major'),
+                 data.get('score'), student_id)
+            )
+            row = cursor.fetchone() if HAS_RETURNING else None
+        if row:
+            return dict(zip(STUDENT_COLUMNS, row))
+        # 没有返回行：学生不存在，或提交的值与原值相同而没有写入
+        return StudentDB.get_by_id(student_id)
 
     @staticmethod
     def delete(student_id: int) -> bool:
         with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM students WHERE id = ?", (student_id,))
-            conn.commit()
+            cursor = conn.execute(SQL_DELETE_STUDENT, (student_id,))
             return cursor.rowcount > 0
 
 
 class NoteDB:
     @staticmethod
-    def get_all() -> List[dict]:
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM notes ORDER BY is_pinned DESC, id DESC")
-            return [dict(row) for row in cursor.fetchall()]
+    def iter_all(batch_size: int = FETCH_BATCH_SIZE) -> Iterator[List[dict]]:
+        yield from _iter_batches(SQL_GET_ALL_NOTES, NOTE_COLUMNS, batch_size)
+
+    @staticmethod
+    def version() -> str:
+        """notes 表的数据版本（数据库 token + 写入计数），每次写入后都会变化"""
+        return _get_table_version('notes')
 
     @staticmethod
     def get_by_id(note_id: int) -> Optional[dict]:
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM notes WHERE id = ?", (note_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
+        row = get_connection().execute(SQL_GET_NOTE, (note_id,)).fetchone()
+        return dict(zip(NOTE_COLUMNS, row)) if row else None
 
     @staticmethod
     def create(data: dict) -> dict:
         with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO notes (title, content, color, is_pinned) VALUES (?, ?, ?, ?)",
+            cursor = conn.execute(
+                SQL_CREATE_NOTE,
                 (data.get('title', '新便签'), data.get('content', ''), data.get('color', 'yellow'), data.get('is_pinned', 0))
             )
-            conn.commit()
+            if HAS_RETURNING:
+                return dict(zip(NOTE_COLUMNS, cursor.fetchone()))
             return NoteDB.get_by_id(cursor.lastrowid)
 
     @staticmethod
     def update(note_id: int, data: dict) -> Optional[dict]:
+        # 只更新 data 中给出且不为 None 的字段；没有可更新的字段时不执行 UPDATE
+        if all(value is None for value in data.values()):
+            return NoteDB.get_by_id(note_id)
         with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE notes SET title=?, content=?, color=?, is_pinned=?, updated_at=CURRENT_TIMESTAMP WHERE id=?",
-                (data.get('title'), data.get('content'), data.get('color'), data.get('is_pinned', 0), note_id)
+            cursor = conn.execute(
+                SQL_UPDATE_NOTE,
+                (data.get('title'), data.get('content'), data.get('color'), data.get('is_pinned'), note_id)
             )
-            conn.commit()
-            return NoteDB.get_by_id(note_id)
+            row = cursor.fetchone() if HAS_RETURNING else None
+        if row:
+            return dict(zip(NOTE_COLUMNS, row))
+        # 没有返回行：便签不存在，或提交的值与原值相同而没有写入
+        return NoteDB.get_by_id(note_id)
 
     @staticmethod
     def delete(note_id: int) -> bool:
         with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM notes WHERE id = ?", (note_id,))
-            conn.commit()
+            cursor = conn.execute(SQL_DELETE_NOTE, (note_id,))
             return cursor.rowcount > 0
 
+    @staticmethod
+    def search(keyword: str) -> List[dict]:
+        global _notes_fts_ready
+        conn = get_connection()
+        if _notes_fts_ready is None:
+            _notes_fts_ready = HAS_FTS_TRIGRAM and _has_notes_fts(conn)
+        if _notes_fts_ready and len(keyword) >= FTS_MIN_KEYWORD_LENGTH:
+            cursor = conn.execute(SQL_SEARCH_NOTES, ('"' + keyword.replace('"', '""') + '"',))
+        else:
+            # 太短的关键字无法用 trigram 索引，退回 LIKE 扫描
+            pattern = '%' + keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            cursor = conn.execute(SQL_SEARCH_NOTES_LIKE, (pattern, pattern))
+        return [dict(zip(NOTE_COLUMNS, row)) for row in cursor.fetchall()]
+
     @staticmethod
     def toggle_pin(note_id: int) -> Optional[dict]:
-        note = NoteDB.get_by_id(note_id)
-        if note:
-            new_pin = 0 if note['is_pinned'] else 1
-            with get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("UPDATE notes SET is_pinned=? WHERE id=?", (new_pin, note_id))
-                conn.commit()
-            return NoteDB.get_by_id(note_id)
-        return None
\ No newline at end of file
+        # 在一条 UPDATE 中完成取反，避免先读后写之间的竞争
+        with get_connection() as conn:
+            cursor = conn.execute(SQL_TOGGLE_NOTE_PIN, (note_id,))
+            if HAS_RETURNING:
+                row = cursor.fetchone()
+                return dict(zip(NOTE_COLUMNS, row)) if row else None
+            return NoteDB.get_by_id(note_id) if cursor.rowcount > 0 else None
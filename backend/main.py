@@ -1,10 +1,15 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from collections import OrderedDict
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+import orjson
+import os
+import threading
 from database import StudentDB, NoteDB, init_database
 
-app = FastAPI(title="学生管理系统API")
+app = FastAPI(title="学生管理系统API", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,6 +36,82 @@ class Note(BaseModel):
     is_pinned: Optional[int] = 0
 
 
+# PUT 支持部分更新：未提交（或为 null）的字段保持原值
+class StudentUpdate(BaseModel):
+    student_id: Optional[str] = None
+    name: Optional[str] = None
+    gender: Optional[str] = None
+    age: Optional[int] = None
+    major: Optional[str] = None
+    score: Optional[float] = None
+
+
+class NoteUpdate(BaseModel):
+    title: Optional[str] = None
+    content: Optional[str] = None
+    color: Optional[str] = None
+    is_pinned: Optional[int] = None
+
+
+def stream_json_array(batches: Iterable[List[dict]]) -> Iterator[bytes]:
+    """把分批读取的行逐批编码成一个 JSON 数组，内存占用只与批大小有关"""
+    yield b"["
+    first = True
+    for batch in batches:
+        chunk = b",".join(orjson.dumps(row) for row in batch)
+        yield chunk if first else b"," + chunk
+        first = False
+    yield b"]"
+
+
+# 列表接口的响应缓存：键 -> (数据版本, JSON 字节)。版本由数据库 token 和每次写入递增的计数组成，
+# 数据未变化时直接返回缓存的字节，不再查询和序列化；带搜索关键字的结果也会缓存，按 LRU 淘汰。
+# 只缓存不超过 RESPONSE_CACHE_MAX_BODY 的响应：更大的列表照常流式输出，不在内存中拼出完整响应，
+# 每个 worker 的缓存最多占用 RESPONSE_CACHE_SIZE * RESPONSE_CACHE_MAX_BODY 字节
+RESPONSE_CACHE_SIZE = 64
+RESPONSE_CACHE_MAX_BODY = 256 * 1024
+_response_cache: "OrderedDict[Tuple[str, ...], Tuple[str, bytes]]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+
+def cached_json_array(request: Request, key: Tuple[str, ...], version: str,
+                      load: Callable[[], Iterable[List[dict]]]) -> Response:
+    """返回带 ETag 的列表响应：客户端版本一致时返回 304，命中缓存时直接返回，否则流式输出，体积不大时写入缓存"""
+    etag = f'"{version}"'
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    with _response_cache_lock:
+        cached = _response_cache.get(key)
+        if cached and cached[0] == version:
+            _response_cache.move_to_end(key)
+            return Response(cached[1], media_type="application/json", headers={"ETag": etag})
+
+    def stream() -> Iterator[bytes]:
+        chunks: Optional[List[bytes]] = []
+        size = 0
+        for chunk in stream_json_array(load()):
+            if chunks is not None:
+                size += len(chunk)
+                if size <= RESPONSE_CACHE_MAX_BODY:
+                    chunks.append(chunk)
+                else:
+                    # 超过上限后丢弃已缓冲的内容，保持流式输出的内存占用只与批大小有关
+                    chunks = None
+            yield chunk
+        with _response_cache_lock:
+            if chunks is None:
+                # 响应过大不缓存，同时丢掉该键下已过期的旧响应
+                _response_cache.pop(key, None)
+                return
+            _response_cache[key] = (version, b"".join(chunks))
+            _response_cache.move_to_end(key)
+            while len(_response_cache) > RESPONSE_CACHE_SIZE:
+                _response_cache.popitem(last=False)
+
+    return StreamingResponse(stream(), media_type="application/json", headers={"ETag": etag})
+
+
 @app.on_event("startup")
 async def startup():
     init_database()
@@ -41,59 +122,86 @@ async def root():
     return {"message": "学生管理系统API运行中"}
 
 
+# 访问数据库的接口都声明为普通 def：sqlite3 调用是阻塞的，Starlette 会把它们放到线程池执行，
+# 不会阻塞事件循环
 @app.get("/api/students")
-async def get_students():
-    return StudentDB.get_all()
+def get_students(request: Request):
+    return cached_json_array(request, ("students",), StudentDB.version(), StudentDB.iter_all)
 
 
 @app.post("/api/students")
-async def create_student(student: Student):
-    return StudentDB.create(student.dict())
+def create_student(student: Student):
+    return StudentDB.create(student.model_dump())
+
+
+@app.post("/api/students/bulk")
+def create_students_bulk(students: List[Student]):
+    created = StudentDB.create_many([student.model_dump() for student in students])
+    return {"success": True, "created": created}
 
 
 @app.put("/api/students/{student_id}")
-async def update_student(student_id: int, student: Student):
-    result = StudentDB.update(student_id, student.dict())
+def update_student(student_id: int, student: StudentUpdate):
+    result = StudentDB.update(student_id, student.model_dump(exclude_unset=True))
     if not result:
         raise HTTPException(status_code=404, detail="学生不存在")
     return result
 
 
 @app.delete("/api/students/{student_id}")
-async def delete_student(student_id: int):
+def delete_student(student_id: int):
     if StudentDB.delete(student_id):
         return {"success": True}
     raise HTTPException(status_code=404, detail="学生不存在")
 
 
 @app.get("/api/notes")
-async def get_notes():
-    return NoteDB.get_all()
+def get_notes(request: Request, q: Optional[str] = None):
+    version = NoteDB.version()
+    if q and q.strip():
+        keyword = q.strip()
+        return cached_json_array(request, ("notes", keyword), version, lambda: [NoteDB.search(keyword)])
+    return cached_json_array(request, ("notes",), version, NoteDB.iter_all)
 
 
 @app.post("/api/notes")
-async def create_note(note: Note):
-    return NoteDB.create(note.dict())
+def create_note(note: Note):
+    return NoteDB.create(note.model_dump())
 
 
 @app.put("/api/notes/{note_id}")
-async def update_note(note_id: int, note: Note):
-    result = NoteDB.update(note_id, note.dict())
+def update_note(note_id: int, note: NoteUpdate):
+    result = NoteDB.update(note_id, note.model_dump(exclude_unset=True))
     if not result:
         raise HTTPException(status_code=404, detail="便签不存在")
     return result
 
 
 @app.delete("/api/notes/{note_id}")
-async def delete_note(note_id: int):
+def delete_note(note_id: int):
     if NoteDB.delete(note_id):
         return {"success": True}
     raise HTTPException(status_code=404, detail="便签不存在")
 
 
 @app.post("/api/notes/{note_id}/toggle-pin")
-async def toggle_pin(note_id: int):
+def toggle_pin(note_id: int):
     result = NoteDB.toggle_pin(note_id)
     if not result:
         raise HTTPException(status_code=404, detail="便签不存在")
-    return result
\ No newline at end of file
+    return result
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # 本地开发设置 DEV=1 开启自动重载（只能单进程）；否则按 WEB_CONCURRENCY 启动多个 worker，
+    # 数据库为 WAL 模式，多个进程可以同时读取
+    dev = os.getenv("DEV") == "1"
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        reload=dev,
+        workers=1 if dev else int(os.getenv("WEB_CONCURRENCY", "4")),
+    )